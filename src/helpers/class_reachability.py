@@ -0,0 +1,453 @@
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import zipfile
+
+PRUNED_CLASSPATH_DIR = '.jbmc-classpath'
+
+# Classes JBMC refers to on its own, whatever the method under test references
+IMPLICIT_CLASSES = [
+    'java/lang/Object',
+    'java/lang/String',
+    'java/lang/Class',
+    'java/lang/Throwable',
+    'java/lang/AssertionError',
+    'java/lang/ArithmeticException',
+    'java/lang/ArrayIndexOutOfBoundsException',
+    'java/lang/ClassCastException',
+    'java/lang/NegativeArraySizeException',
+    'java/lang/NullPointerException',
+]
+
+# Operand sizes of the fixed-length opcodes with operands, by opcode
+OPERAND_SIZES = {0x10: 1, 0x11: 2, 0x12: 1, 0x13: 2, 0x14: 2, 0x84: 2, 0xa9: 1, 0xbc: 1,
+                 0xb9: 4, 0xba: 4, 0xc5: 3, 0xc8: 4, 0xc9: 4}
+OPERAND_SIZES.update({opcode: 1 for opcode in range(0x15, 0x1a)})
+OPERAND_SIZES.update({opcode: 1 for opcode in range(0x36, 0x3b)})
+OPERAND_SIZES.update({opcode: 2 for opcode in range(0x99, 0xa9)})
+OPERAND_SIZES.update({opcode: 2 for opcode in range(0xb2, 0xb9)})
+OPERAND_SIZES.update({opcode: 2 for opcode in (0xbb, 0xbd, 0xc0, 0xc1, 0xc6, 0xc7)})
+# Opcodes whose first operand is a constant pool index
+CONSTANT_POOL_OPCODES = set(range(0xb2, 0xbc)) | {0x12, 0x13, 0x14, 0xbd, 0xc0, 0xc1, 0xc5}
+INVOKE_OPCODES = {0xb6, 0xb7, 0xb8, 0xb9}
+
+def get_descriptor_classes(descriptor: str) -> set:
+    """
+    Extracts the class names referenced by a field or method descriptor.
+
+    Args:
+        descriptor (str): The descriptor, or an array class name.
+
+    Returns:
+        set: Internal class names, such as `java/lang/String`.
+    """
+    return set(re.findall(r'L([^;]+);', descriptor))
+
+def parse_class_file(data: bytes) -> dict:
+    """
+    Parses the class references of a compiled Java class.
+
+    Args:
+        data (bytes): Content of the `.class` file.
+
+    Returns:
+        dict: The class 'header' references (super class, interfaces and field types),
+            all classes referenced by the constant pool as 'constant_pool', and 'methods',
+            a dictionary of the classes and invoked (owner, name) pairs of each method
+            body, by method name.
+    """
+    offset = 8
+    (constant_count,) = struct.unpack_from('>H', data, offset)
+    offset += 2
+
+    constants = [None] * constant_count
+    index = 1
+    while index < constant_count:
+        tag = data[offset]
+        if tag == 1:
+            (length,) = struct.unpack_from('>H', data, offset + 1)
+            constants[index] = (tag, data[offset + 3:offset + 3 + length].decode('utf-8', 'replace'))
+            offset += 3 + length
+        elif tag in (7, 8, 16, 19, 20):
+            constants[index] = (tag, struct.unpack_from('>H', data, offset + 1)[0])
+            offset += 3
+        elif tag in (9, 10, 11, 12, 17, 18):
+            constants[index] = (tag,) + struct.unpack_from('>HH', data, offset + 1)
+            offset += 5
+        elif tag in (3, 4):
+            offset += 5
+        elif tag in (5, 6):
+            # Long and double constants take two slots
+            offset += 9
+            index += 1
+        elif tag == 15:
+            constants[index] = (tag, data[offset + 1], struct.unpack_from('>H', data, offset + 2)[0])
+            offset += 4
+        else:
+            raise ValueError(f'Unknown constant pool tag {tag}')
+        index += 1
+
+    def utf8(i):
+        return constants[i][1]
+
+    def class_name(i):
+        return utf8(constants[i][1])
+
+    def referenced_classes(i):
+        constant = constants[i]
+        if constant is None:
+            return set()
+        if constant[0] == 7:
+            name = class_name(i)
+            return get_descriptor_classes(name) if name.startswith('[') else {name}
+        if constant[0] in (9, 10, 11):
+            _, class_index, name_and_type_index = constant
+            return referenced_classes(class_index) | get_descriptor_classes(utf8(constants[name_and_type_index][2]))
+        if constant[0] == 15:
+            return referenced_classes(constant[2])
+        if constant[0] == 16:
+            return get_descriptor_classes(utf8(constant[1]))
+        if constant[0] == 18:
+            return get_descriptor_classes(utf8(constants[constant[2]][2]))
+        return set()
+
+    def invoked_method(i):
+        _, class_index, name_and_type_index = constants[i]
+        return class_name(class_index), utf8(constants[name_and_type_index][1])
+
+    constant_pool = set()
+    for i, constant in enumerate(constants):
+        if constant is not None and constant[0] in (7, 9, 10, 11):
+            constant_pool |= referenced_classes(i)
+        elif constant is not None and constant[0] == 12:
+            constant_pool |= get_descriptor_classes(utf8(constant[2]))
+
+    offset += 2
+    this_index, super_index, interface_count = struct.unpack_from('>HHH', data, offset)
+    offset += 6
+    header = {class_name(super_index)} if super_index else set()
+    for _ in range(interface_count):
+        header.add(class_name(struct.unpack_from('>H', data, offset)[0]))
+        offset += 2
+
+    def skip_attributes(offset):
+        (attribute_count,) = struct.unpack_from('>H', data, offset)
+        offset += 2
+        attributes = []
+        for _ in range(attribute_count):
+            name_index, length = struct.unpack_from('>HI', data, offset)
+            attributes.append((utf8(name_index), offset + 6, length))
+            offset += 6 + length
+        return offset, attributes
+
+    (field_count,) = struct.unpack_from('>H', data, offset)
+    offset += 2
+    for _ in range(field_count):
+        _, _, descriptor_index = struct.unpack_from('>HHH', data, offset)
+        header |= get_descriptor_classes(utf8(descriptor_index))
+        offset, _ = skip_attributes(offset + 6)
+
+    methods = {}
+    (method_count,) = struct.unpack_from('>H', data, offset)
+    offset += 2
+    for _ in range(method_count):
+        _, name_index, descriptor_index = struct.unpack_from('>HHH', data, offset)
+        offset, attributes = skip_attributes(offset + 6)
+        method = methods.setdefault(utf8(name_index), {'classes': set(), 'invokes': set(), 'dynamic': set()})
+        method['classes'] |= get_descriptor_classes(utf8(descriptor_index))
+        for attribute_name, start, _ in attributes:
+            if attribute_name == 'Code':
+                parse_code(data, start, method, referenced_classes, invoked_method)
+
+    # Lambda bodies and method references are only reached through the method handles
+    # of the bootstrap methods of `invokedynamic` instructions
+    bootstrap_methods = []
+    _, attributes = skip_attributes(offset)
+    for attribute_name, start, _ in attributes:
+        if attribute_name == 'BootstrapMethods':
+            (bootstrap_count,) = struct.unpack_from('>H', data, start)
+            position = start + 2
+            for _ in range(bootstrap_count):
+                method_ref, argument_count = struct.unpack_from('>HH', data, position)
+                arguments = struct.unpack_from(f'>{argument_count}H', data, position + 4)
+                bootstrap_methods.append((method_ref,) + arguments)
+                position += 4 + 2 * argument_count
+
+    for method in methods.values():
+        for dynamic_index in method.pop('dynamic'):
+            bootstrap_index = constants[dynamic_index][1]
+            if bootstrap_index >= len(bootstrap_methods):
+                continue
+            for handle_index in bootstrap_methods[bootstrap_index]:
+                method['classes'] |= referenced_classes(handle_index)
+                handle = constants[handle_index]
+                if handle is not None and handle[0] == 15 and constants[handle[2]][0] in (10, 11):
+                    method['invokes'].add(invoked_method(handle[2]))
+
+    return {'name': class_name(this_index), 'header': header, 'constant_pool': constant_pool, 'methods': methods}
+
+def parse_code(data: bytes, start: int, method: dict, referenced_classes, invoked_method) -> None:
+    """
+    Collects the classes and methods referenced by the instructions of a Code attribute.
+
+    Args:
+        data (bytes): Content of the `.class` file.
+        start (int): Offset of the Code attribute content.
+        method (dict): Method entry, with 'classes' and 'invokes' sets to update, and a
+            'dynamic' set collecting the constants of `invokedynamic` instructions.
+        referenced_classes (callable): Classes referenced by a constant pool entry.
+        invoked_method (callable): (owner, name) of a method reference constant.
+    """
+    (code_length,) = struct.unpack_from('>I', data, start + 4)
+    code_start = start + 8
+    pc = 0
+    while pc < code_length:
+        opcode = data[code_start + pc]
+        if opcode in CONSTANT_POOL_OPCODES:
+            if opcode == 0x12:
+                index = data[code_start + pc + 1]
+            else:
+                (index,) = struct.unpack_from('>H', data, code_start + pc + 1)
+            method['classes'] |= referenced_classes(index)
+            if opcode in INVOKE_OPCODES:
+                method['invokes'].add(invoked_method(index))
+            elif opcode == 0xba:
+                method['dynamic'].add(index)
+
+        if opcode in (0xaa, 0xab):
+            # Switches are padded to a four byte boundary
+            operands = code_start + pc + 1 + (3 - pc % 4)
+            if opcode == 0xaa:
+                low, high = struct.unpack_from('>ii', data, operands + 4)
+                pc = operands - code_start + 12 + 4 * (high - low + 1)
+            else:
+                (pairs,) = struct.unpack_from('>i', data, operands + 4)
+                pc = operands - code_start + 8 + 8 * pairs
+        elif opcode == 0xc4:
+            pc += 6 if data[code_start + pc + 1] == 0x84 else 4
+        else:
+            pc += 1 + OPERAND_SIZES.get(opcode, 0)
+
+    # Catch clauses load their exception classes
+    offset = code_start + code_length
+    (exception_count,) = struct.unpack_from('>H', data, offset)
+    for i in range(exception_count):
+        (catch_index,) = struct.unpack_from('>H', data, offset + 2 + 8 * i + 6)
+        if catch_index:
+            method['classes'] |= referenced_classes(catch_index)
+
+class ClassPath:
+    """
+    Class file lookup and parsing over the entries of a Java classpath.
+
+    Parsed classes are cached, so one instance can serve all methods of a run. Classes
+    from directories are parsed again when their class file changes, so an instance can
+    also be kept across recompilations.
+    """
+
+    def __init__(self, entries: list):
+        """
+        Args:
+            entries (list): Classpath entries, jar files or directories.
+        """
+        self.entries = entries
+        self._jar_classes = {}
+        self._classes = {}
+
+    def get_jar_classes(self, entry: str) -> set:
+        """
+        Lists the classes of a jar entry.
+
+        Args:
+            entry (str): Path to the jar.
+
+        Returns:
+            set: Internal names of the classes in the jar.
+        """
+        if entry not in self._jar_classes:
+            with zipfile.ZipFile(entry) as jar:
+                self._jar_classes[entry] = {name[:-len('.class')] for name in jar.namelist() if name.endswith('.class')}
+        return self._jar_classes[entry]
+
+    def find(self, name: str):
+        """
+        Finds the classpath entry providing a class.
+
+        Args:
+            name (str): Internal class name.
+
+        Returns:
+            str: The classpath entry, or None if no entry provides the class.
+        """
+        for entry in self.entries:
+            if entry.endswith('.jar'):
+                if name in self.get_jar_classes(entry):
+                    return entry
+            elif os.path.isfile(os.path.join(entry, name + '.class')):
+                return entry
+        return None
+
+    def get(self, name: str):
+        """
+        Parses a class from the classpath.
+
+        Args:
+            name (str): Internal class name.
+
+        Returns:
+            dict: The parsed class as returned by `parse_class_file`, with its classpath
+                'entry', or None if no entry provides the class.
+        """
+        cached = self._classes.get(name)
+        if cached is not None:
+            if cached['entry'].endswith('.jar'):
+                return cached
+            path = os.path.join(cached['entry'], name + '.class')
+            if os.path.isfile(path) and os.path.getmtime(path) == cached['mtime']:
+                return cached
+
+        entry = self.find(name)
+        if entry is None:
+            self._classes.pop(name, None)
+            return None
+
+        mtime = None
+        if entry.endswith('.jar'):
+            with zipfile.ZipFile(entry) as jar:
+                data = jar.read(name + '.class')
+        else:
+            path = os.path.join(entry, name + '.class')
+            mtime = os.path.getmtime(path)
+            with open(path, 'rb') as file:
+                data = file.read()
+        parsed = parse_class_file(data)
+        parsed['entry'] = entry
+        parsed['mtime'] = mtime
+        self._classes[name] = parsed
+        return parsed
+
+def get_reachable_classes(classpath: ClassPath, class_name: str, method_name: str) -> set:
+    """
+    Computes the classes reachable from a method.
+
+    Classes found in directories, the code under verification, are followed method
+    by method: a reached class contributes its header, static initializer, and the
+    methods whose names are invoked anywhere in the reached code, to cover virtual
+    dispatch. Classes from jars, the models, contribute their whole constant pool.
+
+    Args:
+        classpath (ClassPath): Classpath to resolve classes on.
+        class_name (str): Name of the class declaring the method.
+        method_name (str): Name of the method.
+
+    Returns:
+        set: Internal names of the reachable classes found on the classpath.
+    """
+    reached = set()
+    invoked_names = {method_name}
+    pending_classes = [class_name.replace('.', '/')] + IMPLICIT_CLASSES
+    visited_methods = set()
+
+    def visit_class(name):
+        if name in reached:
+            return
+        parsed = classpath.get(name)
+        if parsed is None:
+            return
+        reached.add(name)
+        if parsed['entry'].endswith('.jar'):
+            pending_classes.extend(parsed['header'] | parsed['constant_pool'])
+        else:
+            pending_classes.extend(parsed['header'])
+
+    while True:
+        while pending_classes:
+            visit_class(pending_classes.pop())
+
+        # Follow the invoked methods of the reached code classes until nothing new is reached
+        progress = False
+        for name in list(reached):
+            parsed = classpath.get(name)
+            # A class file can disappear while the classpath is shared with a recompilation
+            if parsed is None or parsed['entry'].endswith('.jar'):
+                continue
+            for method, body in parsed['methods'].items():
+                if (name, method) in visited_methods:
+                    continue
+                if method == '<clinit>' or method in invoked_names:
+                    visited_methods.add((name, method))
+                    pending_classes.extend(body['classes'])
+                    invoked_names |= {invoked for _, invoked in body['invokes']}
+                    progress = True
+        if not progress:
+            return reached
+
+def prune_classpath(classpath: ClassPath, reachable: set, cache_dir: str = PRUNED_CLASSPATH_DIR) -> list:
+    """
+    Narrows the classpath to the entries providing reachable classes.
+
+    Jars without reachable classes are dropped, jars with some reachable classes are
+    replaced by a cached jar holding only those. Directories are kept as they are.
+
+    Args:
+        classpath (ClassPath): The full classpath.
+        reachable (set): Internal names of the reachable classes.
+        cache_dir (str, optional): Directory of the narrowed jars.
+
+    Returns:
+        list: The narrowed classpath entries.
+    """
+    entries = []
+    for entry in classpath.entries:
+        if not entry.endswith('.jar'):
+            entries.append(entry)
+            continue
+
+        names = sorted(name for name in reachable if classpath.find(name) == entry)
+        if not names:
+            continue
+        if len(names) == len(classpath.get_jar_classes(entry)):
+            entries.append(entry)
+            continue
+
+        key = f'{os.path.abspath(entry)}:{os.path.getmtime(entry)}:{",".join(names)}'
+        pruned_jar = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.jar')
+        if not os.path.isfile(pruned_jar):
+            os.makedirs(cache_dir, exist_ok=True)
+            # Methods pruned in parallel can build the same jar, each writes its own temp file
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as file, zipfile.ZipFile(entry) as jar, \
+                        zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as out:
+                    for name in names:
+                        out.writestr(name + '.class', jar.read(name + '.class'))
+                os.replace(temp_path, pruned_jar)
+            finally:
+                if os.path.isfile(temp_path):
+                    os.remove(temp_path)
+        entries.append(pruned_jar)
+    return entries
+
+def display_pruning_report(pruned: dict, runtimes: dict, history: dict) -> None:
+    """
+    Displays the classes kept per method and the startup time saved by pruning.
+
+    The time saved is measured against the last recorded run of the method on the full
+    classpath, so it is only available once the method ran without pruning.
+
+    Args:
+        pruned (dict): `{'classes', 'total'}` model classes of each method, by key.
+        runtimes (dict): Runtime of this run in seconds, by key.
+        history (dict): History entries by `<class>.<method>` key, before this run.
+    """
+    print('Classpath pruning report:')
+    for key, info in pruned.items():
+        line = f'  {key}: {info["classes"]}/{info["total"]} classes loaded'
+        full_runtime = history.get(key, {}).get('full_runtime')
+        if full_runtime is not None:
+            line += f', saved {full_runtime - runtimes[key]:.2f}s ({full_runtime:.2f}s on the full classpath)'
+        else:
+            line += ', no full classpath run recorded yet'
+        print(line)
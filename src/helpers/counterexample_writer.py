@@ -0,0 +1,190 @@
+import csv
+import hashlib
+import io
+import os
+import queue
+import threading
+import zipfile
+
+OUTPUT_MODES = ('files', 'zip', 'bundle')
+INDEX_HEADER = ['class_name', 'file_name', 'method', 'reason']
+
+def content_hash_name(source: str, prefix: str = 'CounterExample') -> str:
+    """
+    Build a class name from the hash of the generated source.
+
+    Args:
+        source (str): Generated Java source code.
+        prefix (str, optional): Prefix of the class name.
+
+    Returns:
+        str: Class name of the form `<prefix>_<hash>`.
+    """
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+    return f'{prefix}_{digest}'
+
+class CounterExampleWriter:
+    """
+    Buffered writer for generated counterexample sources.
+
+    Sources are queued by the caller and written in batches by a background thread.
+    Depending on the mode, every counterexample goes to its own `.java` file, to a
+    single zip archive, or to a single combined `.java` bundle. Archive and bundle
+    outputs carry a CSV index mapping class names to methods and failure reasons.
+    Outputs whose content did not change since the previous run are not rewritten.
+    """
+
+    def __init__(self, mode: str = 'files', output_path: str = None, batch_size: int = 256):
+        """
+        Args:
+            mode (str, optional): One of 'files', 'zip' or 'bundle'.
+            output_path (str, optional): Output directory for 'files', archive path for 'zip',
+                source path for 'bundle'. Defaults to the current directory,
+                `CounterExamples.zip` or `CounterExamples.java`.
+            batch_size (int, optional): Maximum number of sources written per batch.
+        """
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f'Unknown output mode \'{mode}\', expected one of {", ".join(OUTPUT_MODES)}')
+
+        default_paths = {'files': '.', 'zip': 'CounterExamples.zip', 'bundle': 'CounterExamples.java'}
+        self.mode = mode
+        self.output_path = output_path or default_paths[mode]
+        self.batch_size = batch_size
+        self.written = 0
+        self.skipped = 0
+
+        self._entries = {}
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, class_name: str, source: str, method: str = '', reason: str = '') -> None:
+        """
+        Queue a counterexample source for writing.
+
+        Args:
+            class_name (str): Name of the generated class.
+            source (str): Generated Java source code.
+            method (str, optional): Method the counterexample belongs to.
+            reason (str, optional): Reason for the counterexample.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((class_name, source, method, reason))
+
+    def close(self) -> None:
+        """Flush the queued sources and write the archive or bundle, if any."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+        if self.mode == 'zip':
+            self._write_zip()
+        elif self.mode == 'bundle':
+            self._write_bundle()
+
+    def get_class_names(self) -> list:
+        """
+        Return the class names of the counterexamples written or left unchanged.
+
+        Returns:
+            list: The class names, in writing order. Complete once the writer is closed.
+        """
+        return list(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self) -> None:
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                done = True
+
+            try:
+                self._write_batch(batch)
+            except Exception as error:
+                self._error = error
+                return
+
+    def _write_batch(self, batch: list) -> None:
+        for class_name, source, method, reason in batch:
+            # Identical sources share a hashed class name, keep the first one
+            if class_name in self._entries:
+                continue
+
+            if self.mode == 'files':
+                file_path = os.path.join(self.output_path, class_name + '.java')
+                if self._write_if_changed(file_path, source):
+                    self.written += 1
+                else:
+                    self.skipped += 1
+                # The source is on disk already, only keep what the index needs
+                source = None
+
+            self._entries[class_name] = (source, method, reason)
+
+    def _write_if_changed(self, file_path: str, content: str) -> bool:
+        if os.path.isfile(file_path):
+            with open(file_path, 'r', newline='') as file:
+                if file.read() == content:
+                    return False
+
+        with open(file_path, 'w', newline='') as file:
+            file.write(content)
+        return True
+
+    def _index(self) -> str:
+        index = io.StringIO()
+        writer = csv.writer(index)
+        writer.writerow(INDEX_HEADER)
+        for class_name, (_, method, reason) in self._entries.items():
+            writer.writerow([class_name, class_name + '.java', method, reason])
+        return index.getvalue()
+
+    def _write_zip(self) -> None:
+        entries = {class_name + '.java': source for class_name, (source, _, _) in self._entries.items()}
+        entries['index.csv'] = self._index()
+
+        # Leave the archive untouched when it already holds exactly these sources
+        if os.path.isfile(self.output_path):
+            try:
+                with zipfile.ZipFile(self.output_path) as archive:
+                    existing = {name: archive.read(name).decode('utf-8') for name in archive.namelist()}
+                if existing == entries:
+                    self.skipped += len(self._entries)
+                    return
+            except zipfile.BadZipFile:
+                pass
+
+        temp_path = self.output_path + '.tmp'
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, content in entries.items():
+                archive.writestr(name, content)
+        os.replace(temp_path, self.output_path)
+        self.written += len(self._entries)
+
+    def _write_bundle(self) -> None:
+        # Non-public classes can share one compilation unit
+        bundle = '\n\n'.join(source for source, _, _ in self._entries.values()) + '\n'
+        index_path = os.path.splitext(self.output_path)[0] + '.index.csv'
+
+        bundle_changed = self._write_if_changed(self.output_path, bundle)
+        index_changed = self._write_if_changed(index_path, self._index())
+        if bundle_changed or index_changed:
+            self.written += len(self._entries)
+        else:
+            self.skipped += len(self._entries)
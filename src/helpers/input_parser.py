@@ -1,6 +1,7 @@
 import xml.etree.ElementTree as ET
 from helpers.input_type_checker import is_array_type, is_class_type, is_primitive_type, is_string_type
 import csv
+from typing import Optional
 
 def get_inputs(xml_source: str):
     """
@@ -18,11 +19,13 @@ def get_inputs(xml_source: str):
     failed_results = [r for r in root.findall('result') if r.get('status') == 'FAILURE']
     for result in failed_results:
         goto_trace = result.find('goto_trace')
+        # One heap per trace, so objects shared between arguments keep their identity
+        heap = new_heap(goto_trace)
         inputs_list = {}
         for trace in goto_trace:
             if trace.tag == 'assignment' and trace.attrib['base_name'].startswith('arg'):
                 value_type = get_input_type(trace)
-                actual_value = get_input_value(trace, goto_trace)
+                actual_value = get_input_value(trace, goto_trace, heap)
                 base_name = trace.get('base_name')
                 inputs_list.setdefault(base_name, {})
                 inputs_list[base_name] = {'type': value_type, 'value': actual_value}
@@ -91,13 +94,33 @@ def get_class_input_type(type_text: str) -> str:
     class_name = type_text.split(' ')[1]
     return class_name
 
-def get_input_value(assignment: ET.Element, trace: ET.Element) -> str:
+def new_heap(trace: ET.Element) -> dict:
+    """
+    Creates the decoding state for the dynamic objects of a single trace.
+
+    The heap indexes the trace assignments by base name once, and memoizes every
+    decoded dynamic object so that aliased and cyclic references resolve to the
+    same dictionary instead of being decoded again.
+
+    Args:
+        trace (ET.Element): The trace element.
+
+    Returns:
+        dict: The heap, with 'assignments' and 'objects' entries.
+    """
+    assignments = {}
+    for assignment in trace.findall('assignment'):
+        assignments.setdefault(assignment.get('base_name'), []).append(assignment)
+    return {'assignments': assignments, 'objects': {}}
+
+def get_input_value(assignment: ET.Element, trace: ET.Element, heap: Optional[dict] = None) -> str:
     """
     Extracts Java values for assignments.
 
     Args:
         assignment (ET.Element): The assignment element.
         trace (ET.Element): The trace element.
+        heap (dict, optional): Decoding state shared by the inputs of the trace.
 
     Returns:
         str: The Java value string.
@@ -115,18 +138,21 @@ def get_input_value(assignment: ET.Element, trace: ET.Element) -> str:
     if is_primitive_type(assignment_type_text):
         return assignment_value_text
 
+    if heap is None:
+        heap = new_heap(trace)
+
     if is_string_type(assignment_type_text):
-        return get_string_input_value(assignment_type_text, assignment_value_text, trace)
-    
+        return get_string_input_value(assignment_type_text, assignment_value_text, trace, heap)
+
     if is_array_type(assignment_type_text):
-        return get_array_input_value(assignment_type_text, assignment_value_text, trace)
+        return get_array_input_value(assignment_type_text, assignment_value_text, trace, heap)
 
     if is_class_type(assignment_type_text):
-        return get_class_input_value(assignment_value_text, trace)
+        return get_class_input_value(assignment_value_text, trace, heap)
 
     raise NotImplementedError(f'\'{assignment_type_text}\' input type not implemented')
 
-def get_string_input_value(assignment_type_text, assignment_value_text, trace):
+def get_string_input_value(assignment_type_text, assignment_value_text, trace, heap=None):
     """
     Extracts string values from assignments.
 
@@ -134,11 +160,15 @@ def get_string_input_value(assignment_type_text, assignment_value_text, trace):
         assignment_type_text (str): The assignment type text.
         assignment_value_text (str): The assignment value text.
         trace (ET.Element): The trace element.
+        heap (dict, optional): Decoding state shared by the inputs of the trace.
 
     Returns:
         str: The string value.
     """
-    assignments = [a for a in trace.findall('assignment') if a.get('base_name') == assignment_value_text[1:]]
+    if heap is None:
+        heap = new_heap(trace)
+
+    assignments = heap['assignments'].get(assignment_value_text[1:], [])
     val = {}
     for assignment in assignments:
         for tags in assignment:
@@ -156,9 +186,9 @@ def get_string_input_value(assignment_type_text, assignment_value_text, trace):
         if full_lhs_text == f'{assignment_value_text[1:]}.data':
             if full_lhs_value_text.startswith('&'):
                 full_lhs_value_text = remove_dynamic_object_pointer_cast(full_lhs_value_text[1:])
-                val['value'], _ = get_string_value(full_lhs_value_text, trace)
+                val['value'], _ = get_string_value(full_lhs_value_text, trace, heap)
             elif full_lhs_value_text.startswith('dynamic_object'):
-                val['value'], _ = get_string_value(full_lhs_value_text, trace)
+                val['value'], _ = get_string_value(full_lhs_value_text, trace, heap)
             else: 
                 val['value'] = full_lhs_value_text
 
@@ -173,8 +203,11 @@ def remove_dynamic_object_pointer_cast(dynamic_obj_name):
     dynamic_obj_name = dynamic_obj_name.split("[")[0]
     return dynamic_obj_name
 
-def get_string_value(dynamic_obj_name, trace):
-    assignments = [a for a in trace.findall('assignment') if a.get('base_name') == dynamic_obj_name]
+def get_string_value(dynamic_obj_name, trace, heap=None):
+    if heap is None:
+        heap = new_heap(trace)
+
+    assignments = heap['assignments'].get(dynamic_obj_name, [])
     array_value = None
     assignment_type = None
     for assignment in assignments:
@@ -191,13 +224,13 @@ def get_string_value(dynamic_obj_name, trace):
                 array_value = full_lhs_value_text
             elif full_lhs_value_text.startswith('&'):
                 full_lhs_value_text = remove_dynamic_object_pointer_cast(full_lhs_value_text[1:])
-                array_value, assignment_type =  get_string_value(full_lhs_value_text, trace)
+                array_value, assignment_type =  get_string_value(full_lhs_value_text, trace, heap)
             elif full_lhs_value_text.startswith('dynamic_object'):
-                array_value, assignment_type = get_string_value(full_lhs_value_text, trace)
+                array_value, assignment_type = get_string_value(full_lhs_value_text, trace, heap)
     
     return array_value, assignment_type
 
-def get_array_input_value(assignment_type_text, assignment_value_text, trace) -> str:
+def get_array_input_value(assignment_type_text, assignment_value_text, trace, heap=None) -> list:
     """
     Extracts array values from assignments.
 
@@ -205,11 +238,25 @@ def get_array_input_value(assignment_type_text, assignment_value_text, trace) ->
         assignment_type_text (str): The assignment type text.
         assignment_value_text (str): The assignment value text.
         trace (ET.Element): The trace element.
+        heap (dict, optional): Decoding state shared by the inputs of the trace.
 
     Returns:
-        str: The array value.
+        list: The array value as [element type, elements]. The same list is returned for
+            every reference to the same array of the heap.
     """
-    assignments = [a for a in trace.findall('assignment') if a.get('base_name') == assignment_value_text[1:]]
+    if heap is None:
+        heap = new_heap(trace)
+
+    array_name = remove_dynamic_object_pointer_cast(assignment_value_text[1:])
+    objects = heap['objects']
+    if array_name in objects:
+        return objects[array_name]
+
+    array = [None, []]
+    # Register before decoding the elements so that cycles through the array terminate
+    objects[array_name] = array
+
+    assignments = heap['assignments'].get(array_name, [])
     val = {}
     for assignment in assignments:
         for tags in assignment:
@@ -221,25 +268,30 @@ def get_array_input_value(assignment_type_text, assignment_value_text, trace) ->
         if full_lhs_value_text.startswith('{'):
             continue
 
-        if full_lhs_text == f'{assignment_value_text[1:]}.length':
+        if full_lhs_text == f'{array_name}.length':
             val['length'] = full_lhs_value_text
 
-        if full_lhs_text == f'{assignment_value_text[1:]}.data':
+        if full_lhs_text == f'{array_name}.data':
             if full_lhs_value_text.startswith('&'):
                 full_lhs_value_text = remove_dynamic_object_pointer_cast(full_lhs_value_text[1:])
-                val['value'], val["type"] = get_array_value(full_lhs_value_text, trace)
+                val['value'], val["type"] = get_array_value(full_lhs_value_text, trace, heap)
             elif full_lhs_value_text.startswith('dynamic_object'):
-                val['value'], val["type"] = get_array_value(full_lhs_value_text, trace)
+                val['value'], val["type"] = get_array_value(full_lhs_value_text, trace, heap)
             else: 
                 val['value'] = full_lhs_value_text
     
     actual_array_value = val['value']
     actual_array_value = actual_array_value[0: int(val["length"])]
     val["value"] = actual_array_value
-    return [get_array_input_type(val["type"]), val["value"]]
+    array[0] = get_array_input_type(val["type"])
+    array[1].extend(val["value"])
+    return array
+
+def get_array_value(dynamic_obj_name, trace, heap=None):
+    if heap is None:
+        heap = new_heap(trace)
 
-def get_array_value(dynamic_obj_name, trace):
-    assignments = [a for a in trace.findall('assignment') if a.get('base_name') == dynamic_obj_name]
+    assignments = heap['assignments'].get(dynamic_obj_name, [])
     array_value = None
     assignment_type = None
     for assignment in assignments:
@@ -256,9 +308,9 @@ def get_array_value(dynamic_obj_name, trace):
                 array_value = full_lhs_value_text
             elif full_lhs_value_text.startswith('&'):
                 full_lhs_value_text = remove_dynamic_object_pointer_cast(full_lhs_value_text[1:])
-                array_value, assignment_type =  get_array_value(full_lhs_value_text, trace)
+                array_value, assignment_type =  get_array_value(full_lhs_value_text, trace, heap)
             elif full_lhs_value_text.startswith('dynamic_object'):
-                array_value, assignment_type = get_array_value(full_lhs_value_text, trace)
+                array_value, assignment_type = get_array_value(full_lhs_value_text, trace, heap)
 
     
     actual_array_value = list(csv.reader([array_value[1:-1]], delimiter=',', quotechar='"'))[0]
@@ -281,42 +333,62 @@ def get_array_value(dynamic_obj_name, trace):
 
     for index,value in enumerate(actual_array_value):
         if value.startswith("&"):
-            actual_array_value[index] = get_dynamic_obj_value(value[1:], trace)
+            actual_array_value[index] = get_dynamic_obj_value(value[1:], trace, heap)
 
     return actual_array_value, assignment_type
 
-def get_class_input_value(assignment_value_text: str, trace: ET.Element) -> dict:
+def get_class_input_value(assignment_value_text: str, trace: ET.Element, heap: Optional[dict] = None) -> dict:
     """
     Extracts class values from assignments.
 
     Args:
         assignment_value_text (str): The assignment value text.
         trace (ET.Element): The trace element.
+        heap (dict, optional): Decoding state shared by the inputs of the trace.
 
     Returns:
         dict: The class value dictionary.
     """
-    return get_dynamic_obj_value(assignment_value_text[1:], trace)
+    return get_dynamic_obj_value(assignment_value_text[1:], trace, heap)
 
-def get_dynamic_obj_value(dynamic_obj_name: str, trace: ET.Element) -> dict:
+def get_dynamic_obj_value(dynamic_obj_name: str, trace: ET.Element, heap: Optional[dict] = None) -> dict:
     """
     Extracts dynamic object values from assignments.
 
+    Each dynamic object is decoded once per heap. References to an object that was
+    already decoded, including references back to an object that is still being
+    decoded, return the same dictionary, so the result is a graph with identity.
+    Array fields are decoded with `get_array_input_value`, sharing the same heap.
+
     Args:
         dynamic_obj_name (str): The dynamic object name.
         trace (ET.Element): The trace element.
+        heap (dict, optional): Decoding state shared by the inputs of the trace.
 
     Returns:
         dict: The dynamic object value dictionary.
     """
-    assignments = [a for a in trace.findall('assignment') if a.get('base_name') == dynamic_obj_name]
+    if heap is None:
+        heap = new_heap(trace)
+
+    dynamic_obj_name = remove_dynamic_object_pointer_cast(dynamic_obj_name)
+    objects = heap['objects']
+    if dynamic_obj_name in objects:
+        return objects[dynamic_obj_name]
+
     val = {}
-    for assignment in assignments:
+    # Register before visiting fields so that cycles terminate on this entry
+    objects[dynamic_obj_name] = val
+
+    for assignment in heap['assignments'].get(dynamic_obj_name, []):
+        full_lhs_type_text = ''
         for tags in assignment:
             if tags.tag == 'full_lhs':
                 full_lhs_text = tags.text
             elif tags.tag == 'full_lhs_value':
                 full_lhs_value_text = tags.text
+            elif tags.tag == 'full_lhs_type':
+                full_lhs_type_text = tags.text
 
         if full_lhs_text == f'{dynamic_obj_name}.@java.lang.Object.@class_identifier':
             val['__class'] = full_lhs_value_text.strip('"').split('::')[-1]
@@ -325,8 +397,10 @@ def get_dynamic_obj_value(dynamic_obj_name: str, trace: ET.Element) -> dict:
         if full_lhs_text == f'{dynamic_obj_name}.@java.lang.Object.cproverMonitorCount':
             continue
 
-        if full_lhs_value_text.startswith('&'):
-            value = get_dynamic_obj_value(full_lhs_value_text[1:], trace)
+        if full_lhs_value_text.startswith('&') and is_array_type(full_lhs_type_text):
+            value = get_array_input_value(full_lhs_type_text, full_lhs_value_text, trace, heap)
+        elif full_lhs_value_text.startswith('&'):
+            value = get_dynamic_obj_value(full_lhs_value_text[1:], trace, heap)
         else:
             value = full_lhs_value_text
 
@@ -20,14 +20,47 @@ def get_trace_xml(jbmc_path: str, class_name: str, method_name: str, options=Non
     Returns:
         str: XML trace generated by JBMC.
     """
+    result = run(get_jbmc_command(jbmc_path, class_name, method_name, options), capture_output=True, text=True)
+    return result.stdout
+
+def start_trace_xml(jbmc_path: str, class_name: str, method_name: str, options=None) -> subprocess.Popen:
+    """
+    Start JBMC for the given Java class and method without waiting for its XML trace.
+
+    The trace is read from the process standard output. Unlike `get_trace_xml`, the
+    run can be cancelled by terminating the process.
+
+    Args:
+        jbmc_path (str): Path to the JBMC executable.
+        class_name (str): Name of the Java class.
+        method_name (str): Name of the method.
+        options (list, optional): Additional options for JBMC.
+
+    Returns:
+        subprocess.Popen: The running JBMC process.
+    """
+    command = get_jbmc_command(jbmc_path, class_name, method_name, options)
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+def get_jbmc_command(jbmc_path: str, class_name: str, method_name: str, options=None) -> list:
+    """
+    Build the JBMC command producing the XML trace of the given Java class and method.
+
+    Args:
+        jbmc_path (str): Path to the JBMC executable.
+        class_name (str): Name of the Java class.
+        method_name (str): Name of the method.
+        options (list, optional): Additional options for JBMC.
+
+    Returns:
+        list: The JBMC command.
+    """
     assert options is None or len(options) > 0
 
     command = [jbmc_path, f'{class_name}.{method_name}', '--xml-ui']
     if options is not None:
         command.extend(options)
-
-    result = run(command, capture_output=True, text=True)
-    return result.stdout
+    return command
 
 def get_all_method_names(java_file_path: str) -> list:
     """
@@ -48,6 +81,77 @@ def get_all_method_names(java_file_path: str) -> list:
         method_names.extend(matches)
     return method_names
 
+def get_method_sources(java_file_path: str) -> dict:
+    """
+    Extracts the source text of every method found in the Java file.
+
+    Overloads of a method are concatenated under the method name.
+
+    Args:
+        java_file_path (str): Path to the Java source file.
+
+    Returns:
+        dict: Method source text, from the signature to the closing brace, by method name.
+    """
+    method_sources = {}
+    with open(java_file_path, 'r') as file:
+        content = file.read()
+    # Same method pattern as `get_all_method_names`
+    method_pattern = re.compile(r'\b(?:public|private|protected|static|\s) +[\w\<\>\[\]]+\s+(\w+)\s*\([^)]*\)\s*{')
+    for match in method_pattern.finditer(content):
+        depth = 0
+        end = len(content)
+        for position in range(match.end() - 1, len(content)):
+            if content[position] == '{':
+                depth += 1
+            elif content[position] == '}':
+                depth -= 1
+                if depth == 0:
+                    end = position + 1
+                    break
+        method_sources[match.group(1)] = method_sources.get(match.group(1), '') + content[match.start():end]
+    return method_sources
+
+def get_all_method_signatures(java_file_path: str) -> list:
+    """
+    Extracts the signatures of all methods found in the Java file.
+
+    Methods whose parameter list cannot be split, such as generic types with
+    several type arguments, are left out.
+
+    Args:
+        java_file_path (str): Path to the Java source file.
+
+    Returns:
+        list: List of dictionaries with the method 'name', whether it is 'static',
+            and its 'parameters' as a list of (type, name) tuples.
+    """
+    signatures = []
+    with open(java_file_path, 'r') as file:
+        content = file.read()
+    # Same method pattern as `get_all_method_names`, also capturing the parameter list
+    method_pattern = re.compile(r'\b(?:public|private|protected|static|\s) +[\w\<\>\[\]]+\s+(\w+)\s*\(([^)]*)\)\s*{')
+    for match in method_pattern.finditer(content):
+        line_start = content.rfind('\n', 0, match.start()) + 1
+        modifiers = content[line_start:match.start(1)].split()
+
+        parameters = []
+        for parameter in filter(None, (p.strip() for p in match.group(2).split(','))):
+            tokens = [t for t in parameter.split() if t != 'final' and not t.startswith('@')]
+            if len(tokens) != 2 or tokens[0].count('<') != tokens[0].count('>'):
+                parameters = None
+                break
+            param_type, param_name = tokens
+            param_type = param_type.replace('...', '[]')
+            while param_name.endswith('[]'):
+                param_name = param_name[:-2]
+                param_type += '[]'
+            parameters.append((param_type, param_name))
+
+        if parameters is not None:
+            signatures.append({'name': match.group(1), 'static': 'static' in modifiers, 'parameters': parameters})
+    return signatures
+
 def generate_java_source(test_class_name: str, out_class_name: str, counterexample_inputs, reason: str, method_name: str) -> str:
     """
     Generate Java source code from counterexample inputs.
@@ -75,6 +179,9 @@ def generate_java_source(test_class_name: str, out_class_name: str, counterexamp
     var_name_base = "classVar"
     var_index = 0
 
+    # Objects already emitted, shared by all inputs so aliases across arguments are kept
+    emitted = {}
+
     # Iterate through counterexample inputs
     for var_name, var_info in counterexample_inputs.items():
         var_type = var_info['type']
@@ -82,9 +189,15 @@ def generate_java_source(test_class_name: str, out_class_name: str, counterexamp
 
         # Handle object and array initialization
         if isinstance(var_value, dict):
-            source_code.extend(generate_object_initialization(var_name, var_value, indent=2))
+            if id(var_value) in emitted:
+                source_code.append(f"\t\t{var_type} {var_name} = {emitted[id(var_value)]};")
+            else:
+                source_code.extend(generate_object_initialization(var_name, var_value, indent=2, emitted=emitted))
         elif isinstance(var_value, list):
-            source_code.extend(generate_array_initialization(var_name, var_value, indent=2))
+            if id(var_value) in emitted:
+                source_code.append(f"\t\t{var_type} {var_name} = {emitted[id(var_value)]};")
+            else:
+                source_code.extend(generate_array_initialization(var_name, var_value, indent=2, emitted=emitted))
         else:
             # Construct assignment expression
             assignment_expr = f"{var_type} {var_name} = {var_value}"
@@ -100,23 +213,31 @@ def generate_java_source(test_class_name: str, out_class_name: str, counterexamp
 
     return '\n'.join(source_code)
 
-def generate_object_initialization(var_name, obj_value: dict, indent=0) -> list:
+def generate_object_initialization(var_name, obj_value: dict, indent=0, emitted=None) -> list:
     """
     Generate object initialization code recursively.
 
+    Every object and array is declared once as a local variable. Later references to
+    the same value, including cyclic ones, only assign the existing variable.
+
     Args:
         var_name (str): Name of the variable.
         obj_value (dict): Object value.
         indent (int, optional): Indentation level.
+        emitted (dict, optional): Variable names of the objects already emitted, by id.
 
     Returns:
         list: List of lines of code for object initialization.
     """
+    if emitted is None:
+        emitted = {}
+
     source = []
     indent_str = "\t" * indent
 
     # Initialize object
     source.append(f'{indent_str}{obj_value["__class"]} {var_name} = new {obj_value["__class"]}();')
+    emitted[id(obj_value)] = var_name
 
     # Populate object properties
     for prop_name, prop_value in obj_value.items():
@@ -126,34 +247,58 @@ def generate_object_initialization(var_name, obj_value: dict, indent=0) -> list:
         if isinstance(prop_value, str):
             source.append(f'{indent_str}{var_name}.{prop_name} = {prop_value};')
         elif isinstance(prop_value, dict):
-            sub_obj_code = generate_object_initialization(f'{prop_name}_{var_name}', prop_value, indent)
-            source.extend(sub_obj_code)
-            source.append(f'{indent_str}{var_name}.{prop_name} = {prop_name}_{var_name};')
+            if id(prop_value) not in emitted:
+                sub_obj_code = generate_object_initialization(f'{prop_name}_{var_name}', prop_value, indent, emitted)
+                source.extend(sub_obj_code)
+            source.append(f'{indent_str}{var_name}.{prop_name} = {emitted[id(prop_value)]};')
+        elif isinstance(prop_value, list):
+            if id(prop_value) not in emitted:
+                sub_array_code = generate_array_initialization(f'{prop_name}_{var_name}', prop_value, indent, emitted)
+                source.extend(sub_array_code)
+            source.append(f'{indent_str}{var_name}.{prop_name} = {emitted[id(prop_value)]};')
 
     return source
 
-def generate_array_initialization(var_name, array_value: list, indent=0) -> list:
+def generate_array_initialization(var_name, array_value: list, indent=0, emitted=None) -> list:
     """
     Generate array initialization code.
 
+    Elements that are arrays themselves are declared as local variables first, as
+    objects are.
+
     Args:
         var_name (str): Name of the variable.
-        array_value (list): Array value.
+        array_value (list): Array value, as [element type, elements].
         indent (int, optional): Indentation level.
+        emitted (dict, optional): Variable names of the objects already emitted, by id.
 
     Returns:
         list: List of lines of code for array initialization.
     """
+    if emitted is None:
+        emitted = {}
+
     source = []
     indent_str = "\t" * indent
 
     array_type, elements = array_value
-    source.append(f'{indent_str}{array_type}[] {var_name} = new {array_type}[{len(elements)}];')
+    # The length goes in the first dimension: `new int[n][]` for an `int[][]`
+    base_type = array_type.split('[')[0]
+    extra_dimensions = array_type[len(base_type):]
+    source.append(f'{indent_str}{array_type}[] {var_name} = new {base_type}[{len(elements)}]{extra_dimensions};')
+    emitted[id(array_value)] = var_name
 
     for i, element in enumerate(elements):
         if isinstance(element, dict):
-            sub_obj_code = generate_object_initialization(f'{var_name}[{i}]', element, indent)
-            source.extend(sub_obj_code)
+            if id(element) not in emitted:
+                sub_obj_code = generate_object_initialization(f'{var_name}_{i}', element, indent, emitted)
+                source.extend(sub_obj_code)
+            source.append(f'{indent_str}{var_name}[{i}] = {emitted[id(element)]};')
+        elif isinstance(element, list):
+            if id(element) not in emitted:
+                sub_array_code = generate_array_initialization(f'{var_name}_{i}', element, indent, emitted)
+                source.extend(sub_array_code)
+            source.append(f'{indent_str}{var_name}[{i}] = {emitted[id(element)]};')
         else:
             source.append(f'{indent_str}{var_name}[{i}] = {element};')
 
@@ -0,0 +1,247 @@
+import heapq
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import run
+
+HISTORY_FILE = '.jbmc-history.json'
+
+# Seconds per bytecode instruction and per loop and unwind, used when no history is available
+DEFAULT_SECONDS_PER_INSTRUCTION = 0.01
+DEFAULT_SECONDS_PER_LOOP_UNWIND = 0.05
+# Weight of the latest run when updating the recorded runtime
+HISTORY_WEIGHT = 0.5
+
+def read_history_file(history_path: str = HISTORY_FILE) -> dict:
+    """
+    Read the history file, with the entries of every unwind limit.
+
+    Args:
+        history_path (str, optional): Path to the history file.
+
+    Returns:
+        dict: History entries by `<class>.<method>` key, by unwind limit.
+    """
+    if not os.path.isfile(history_path):
+        return {}
+    try:
+        with open(history_path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # A corrupt history only costs us the estimates
+        return {}
+
+def load_history(unwind_limit: int, history_path: str = HISTORY_FILE) -> dict:
+    """
+    Load the per-method JBMC runtimes and trace sizes recorded at an unwind limit.
+
+    Runtimes depend mostly on the unwind limit, so runs at other limits are not used.
+
+    Args:
+        unwind_limit (int): Unwind limit for JBMC.
+        history_path (str, optional): Path to the history file.
+
+    Returns:
+        dict: History entries by `<class>.<method>` key.
+    """
+    return read_history_file(history_path).get(str(unwind_limit), {})
+
+def save_history(history: dict, unwind_limit: int, history_path: str = HISTORY_FILE) -> None:
+    """
+    Save the per-method JBMC runtimes and trace sizes recorded at an unwind limit.
+
+    Args:
+        history (dict): History entries by `<class>.<method>` key.
+        unwind_limit (int): Unwind limit for JBMC.
+        history_path (str, optional): Path to the history file.
+    """
+    histories = read_history_file(history_path)
+    histories[str(unwind_limit)] = history
+
+    temp_path = history_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(histories, file, indent=2, sort_keys=True)
+    os.replace(temp_path, history_path)
+
+def record_run(history: dict, key: str, runtime: float, trace_size: int, full_classpath: bool = True) -> None:
+    """
+    Record the runtime and trace size of a JBMC run in the history.
+
+    Runs on the full classpath are also recorded as 'full_runtime', the baseline
+    pruned runs are compared against.
+
+    Args:
+        history (dict): History entries by `<class>.<method>` key.
+        key (str): `<class>.<method>` key of the run.
+        runtime (float): Wall time of the JBMC run, in seconds.
+        trace_size (int): Size of the XML trace produced by the run, in characters.
+        full_classpath (bool, optional): Whether JBMC ran on the full classpath.
+    """
+    entry = history.get(key, {})
+    full_runtime = entry.get('full_runtime')
+    if full_classpath:
+        full_runtime = runtime if full_runtime is None else HISTORY_WEIGHT * runtime + (1 - HISTORY_WEIGHT) * full_runtime
+    if 'runtime' in entry:
+        runtime = HISTORY_WEIGHT * runtime + (1 - HISTORY_WEIGHT) * entry['runtime']
+
+    history[key] = {'runtime': runtime, 'trace_size': trace_size}
+    if full_runtime is not None:
+        history[key]['full_runtime'] = full_runtime
+
+def get_bytecode_stats(class_name: str, classpath: str = '.') -> dict:
+    """
+    Extracts per-method bytecode length and loop count from a compiled class with `javap`.
+
+    A loop is counted for every branch whose target lies before the branch instruction.
+
+    Args:
+        class_name (str): Name of the compiled Java class.
+        classpath (str, optional): Classpath to look the class up in.
+
+    Returns:
+        dict: `{'length': int, 'loops': int}` by method name. Empty if `javap` fails.
+    """
+    try:
+        result = run(['javap', '-c', '-p', '-cp', classpath, class_name], capture_output=True, text=True)
+    except OSError:
+        return {}
+
+    member_pattern = re.compile(r'^  \S.*;$')
+    method_pattern = re.compile(r'^  \S.*?(\w+)\(.*\).*;$')
+    instruction_pattern = re.compile(r'^\s+(\d+): (\w+)\s*(\d+)?')
+    stats = {}
+    current = None
+    for line in result.stdout.splitlines():
+        # Every member starts a new section, so the code of `static {}` and of fields is not
+        # counted against the method printed before it
+        if member_pattern.match(line):
+            method_match = method_pattern.match(line)
+            if line.strip() == 'static {};':
+                current = stats.setdefault('<clinit>', {'length': 0, 'loops': 0})
+            elif method_match:
+                current = stats.setdefault(method_match.group(1), {'length': 0, 'loops': 0})
+            else:
+                current = None
+            continue
+
+        instruction_match = instruction_pattern.match(line)
+        if instruction_match is None or current is None:
+            continue
+
+        offset = int(instruction_match.group(1))
+        opcode = instruction_match.group(2)
+        current['length'] = max(current['length'], offset + 1)
+        target = instruction_match.group(3)
+        if (opcode.startswith('if') or opcode.startswith('goto')) and target is not None and int(target) < offset:
+            current['loops'] += 1
+    return stats
+
+def estimate_runtimes(keys: list, history: dict, bytecode_stats: dict, unwind_limit: int) -> dict:
+    """
+    Estimates the JBMC runtime of each job.
+
+    Jobs with history use their recorded runtime. Other jobs get a size-based estimate
+    from their bytecode length and loop count, scaled to match the recorded runtimes of
+    this run's jobs when there are any.
+
+    Args:
+        keys (list): `<class>.<method>` keys of the jobs.
+        history (dict): History entries by `<class>.<method>` key.
+        bytecode_stats (dict): Bytecode length and loop count by method name.
+        unwind_limit (int): Unwind limit for JBMC.
+
+    Returns:
+        dict: Estimated runtime in seconds by key.
+    """
+    def size_estimate(key):
+        stats = bytecode_stats.get(key.split('.')[-1], {'length': 0, 'loops': 0})
+        return (DEFAULT_SECONDS_PER_INSTRUCTION * stats['length']
+                + DEFAULT_SECONDS_PER_LOOP_UNWIND * stats['loops'] * unwind_limit)
+
+    # Calibrate the size-based estimate against the jobs we have measured
+    known = [key for key in keys if key in history and size_estimate(key) > 0]
+    scale = 1.0
+    if known:
+        scale = sum(history[key]['runtime'] for key in known) / sum(size_estimate(key) for key in known)
+
+    estimates = {}
+    for key in keys:
+        if key in history:
+            estimates[key] = history[key]['runtime']
+        else:
+            estimates[key] = scale * size_estimate(key)
+    return estimates
+
+def plan_longest_first(estimates: dict, workers: int, history: dict = None) -> tuple:
+    """
+    Orders jobs longest-first and packs them on the least loaded worker.
+
+    Jobs with equal estimates are ordered by their recorded trace size, largest first.
+
+    Args:
+        estimates (dict): Estimated runtime in seconds by key.
+        workers (int): Number of workers.
+        history (dict, optional): History entries by `<class>.<method>` key.
+
+    Returns:
+        tuple: Keys in dispatch order, and the predicted total wall time in seconds.
+    """
+    history = history or {}
+    order = sorted(estimates, key=lambda key: (estimates[key], history.get(key, {}).get('trace_size', 0)), reverse=True)
+    loads = [0.0] * max(1, workers)
+    for key in order:
+        heapq.heapreplace(loads, loads[0] + estimates[key])
+    return order, max(loads)
+
+def run_scheduled(jobs: dict, run_job, workers: int, estimates: dict, history: dict = None) -> dict:
+    """
+    Runs jobs longest-first on a pool of workers.
+
+    Args:
+        jobs (dict): Job arguments by key.
+        run_job (callable): Called with the job arguments, returns the job result.
+        workers (int): Number of workers.
+        estimates (dict): Estimated runtime in seconds by key.
+        history (dict, optional): History entries by `<class>.<method>` key.
+
+    Returns:
+        dict: `{'results', 'runtimes', 'predicted', 'actual'}` with the result and runtime
+            of each job by key, and the predicted and actual total wall time in seconds.
+    """
+    order, predicted = plan_longest_first(estimates, workers, history)
+
+    def timed(key):
+        start_time = time.time()
+        result = run_job(jobs[key])
+        return result, time.time() - start_time
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Submitting in dispatch order hands the longest pending job to the next free worker
+        futures = {key: executor.submit(timed, key) for key in order}
+        outcomes = {key: future.result() for key, future in futures.items()}
+    actual = time.time() - start_time
+
+    return {
+        'results': {key: result for key, (result, _) in outcomes.items()},
+        'runtimes': {key: runtime for key, (_, runtime) in outcomes.items()},
+        'predicted': predicted,
+        'actual': actual,
+    }
+
+def display_schedule_report(schedule: dict, estimates: dict, history: dict) -> None:
+    """
+    Displays the predicted and actual wall time of a scheduled run.
+
+    Args:
+        schedule (dict): Result of `run_scheduled`.
+        estimates (dict): Estimated runtime in seconds by key.
+        history (dict): History entries by `<class>.<method>` key, after the run.
+    """
+    print('Schedule report:')
+    for key in sorted(schedule['runtimes'], key=lambda key: schedule['runtimes'][key], reverse=True):
+        trace_size = history.get(key, {}).get('trace_size', 0)
+        print(f'  {key}: predicted {estimates[key]:.2f}s, actual {schedule["runtimes"][key]:.2f}s, trace {trace_size} chars')
+    print(f'Total wall time: predicted {schedule["predicted"]:.2f}s, actual {schedule["actual"]:.2f}s')
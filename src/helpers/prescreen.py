@@ -0,0 +1,301 @@
+import os
+import random
+import re
+import subprocess
+from helpers.java_helpers import get_all_method_signatures
+
+# Boundary values tried for every parameter, as Java literals
+BOUNDARY_VALUES = {
+    'int': ['0', '1', '-1', 'Integer.MAX_VALUE', 'Integer.MIN_VALUE'],
+    'long': ['0L', '1L', '-1L', 'Long.MAX_VALUE', 'Long.MIN_VALUE'],
+    'short': ['(short) 0', '(short) 1', '(short) -1', 'Short.MAX_VALUE', 'Short.MIN_VALUE'],
+    'byte': ['(byte) 0', '(byte) 1', '(byte) -1', 'Byte.MAX_VALUE', 'Byte.MIN_VALUE'],
+    'char': ['(char) 0', '\'a\'', 'Character.MAX_VALUE'],
+    'double': ['0.0', '1.0', '-1.0', 'Double.NaN', 'Double.MAX_VALUE'],
+    'float': ['0.0f', '1.0f', '-1.0f', 'Float.NaN', 'Float.MAX_VALUE'],
+    'boolean': ['false', 'true'],
+    'String': ['null', '""', '"a"'],
+}
+BOUNDARY_ARRAY_LENGTHS = [0, 1]
+RANDOM_CASES = 8
+MAX_RANDOM_ARRAY_LENGTH = 4
+PRESCREEN_TIMEOUT = 30
+
+def get_random_value(java_type: str, rng: random.Random) -> str:
+    """
+    Generate a random Java literal of the given primitive or String type.
+
+    Args:
+        java_type (str): The Java type.
+        rng (random.Random): Random number generator.
+
+    Returns:
+        str: The Java literal.
+    """
+    if java_type == 'int':
+        return str(rng.randint(-1000, 1000))
+    if java_type == 'long':
+        return f'{rng.randint(-1000, 1000)}L'
+    if java_type in ('short', 'byte'):
+        return f'({java_type}) {rng.randint(-100, 100)}'
+    if java_type == 'char':
+        return f'\'{rng.choice("abcxyz019")}\''
+    if java_type == 'double':
+        return repr(rng.uniform(-1000, 1000))
+    if java_type == 'float':
+        return f'{rng.uniform(-1000, 1000)}f'
+    if java_type == 'boolean':
+        return rng.choice(['false', 'true'])
+    if java_type == 'String':
+        return '"' + ''.join(rng.choice('abcxyz019 ') for _ in range(rng.randint(0, 6))) + '"'
+    return 'null'
+
+def get_default_value(java_type: str):
+    """
+    Return the non-null value a parameter keeps while another parameter is varied.
+
+    Args:
+        java_type (str): The Java type.
+
+    Returns:
+        The Java literal, or an array value as [element type, elements].
+    """
+    if java_type.endswith('[]'):
+        element_type = java_type[:-2]
+        return [element_type, [get_default_value(element_type)]]
+    if java_type in BOUNDARY_VALUES:
+        return BOUNDARY_VALUES[java_type][1] if java_type != 'String' else '"a"'
+    return 'null'
+
+def get_boundary_values(java_type: str) -> list:
+    """
+    Return the boundary values of a parameter type.
+
+    Array values use the same [element type, elements] form as the trace parser.
+    Other class types can only be screened with null.
+
+    Args:
+        java_type (str): The Java type.
+
+    Returns:
+        list: The boundary values.
+    """
+    if java_type.endswith('[]'):
+        element_type = java_type[:-2]
+        values = ['null']
+        for length in BOUNDARY_ARRAY_LENGTHS:
+            values.append([element_type, [get_default_value(element_type)] * length])
+        return values
+    if java_type in BOUNDARY_VALUES:
+        return BOUNDARY_VALUES[java_type]
+    return ['null']
+
+def get_random_input(java_type: str, rng: random.Random):
+    """
+    Generate a random value of a parameter type.
+
+    Args:
+        java_type (str): The Java type.
+        rng (random.Random): Random number generator.
+
+    Returns:
+        The Java literal, or an array value as [element type, elements].
+    """
+    if java_type.endswith('[]'):
+        element_type = java_type[:-2]
+        length = rng.randint(0, MAX_RANDOM_ARRAY_LENGTH)
+        return [element_type, [get_random_input(element_type, rng) for _ in range(length)]]
+    return get_random_value(java_type, rng)
+
+def get_cases(parameters: list, rng: random.Random) -> list:
+    """
+    Build the input cases of a method.
+
+    Each parameter is varied over its boundary values while the others keep a
+    default value, followed by a few fully random cases.
+
+    Args:
+        parameters (list): List of (type, name) tuples.
+        rng (random.Random): Random number generator.
+
+    Returns:
+        list: List of input dictionaries, by parameter name.
+    """
+    defaults = {name: get_default_value(java_type) for java_type, name in parameters}
+    cases = [defaults]
+
+    def add_case(case):
+        # Class types only ever get null, so most of their cases repeat
+        if case not in cases:
+            cases.append(case)
+
+    for java_type, name in parameters:
+        for value in get_boundary_values(java_type):
+            add_case(dict(defaults, **{name: value}))
+
+    if parameters:
+        for _ in range(RANDOM_CASES):
+            add_case({name: get_random_input(java_type, rng) for java_type, name in parameters})
+    return cases
+
+def to_java_expression(java_type: str, value) -> str:
+    """
+    Convert an input value to a Java expression.
+
+    Args:
+        java_type (str): The Java type.
+        value: The Java literal, or an array value as [element type, elements].
+
+    Returns:
+        str: The Java expression.
+    """
+    if isinstance(value, list):
+        element_type, elements = value
+        return f'new {java_type}{{{", ".join(to_java_expression(element_type, e) for e in elements)}}}'
+    return value
+
+def get_erased_type(java_type: str) -> str:
+    """Strip generic type arguments, as needed by class literals."""
+    while '<' in java_type:
+        start = java_type.index('<')
+        end = java_type.rindex('>')
+        java_type = java_type[:start] + java_type[end + 1:]
+    return java_type
+
+def get_import_lines(file_path: str) -> list:
+    """
+    Extracts the import declarations of a Java source file.
+
+    Args:
+        file_path (str): Path to the Java source file.
+
+    Returns:
+        list: The import declarations, as written in the source.
+    """
+    with open(file_path, 'r') as file:
+        content = file.read()
+    import_pattern = re.compile(r'^\s*(import\s+(?:static\s+)?[\w.]+(?:\.\*)?\s*;)', re.MULTILINE)
+    return [' '.join(line.split()) for line in import_pattern.findall(content)]
+
+def generate_prescreen_source(class_name: str, harness_name: str, methods: list, imports: list = None) -> str:
+    """
+    Generate the Java harness that runs every case in one JVM.
+
+    The harness prints a `CRASH` line for each case whose method throws, flushing
+    after every method so that a timeout keeps the results found so far.
+
+    Args:
+        class_name (str): Name of the class under test.
+        harness_name (str): Name of the generated harness class.
+        methods (list): List of (signature, cases, first case index) tuples.
+        imports (list, optional): Import declarations of the class under test, so that
+            parameter types resolve as they do in its source.
+
+    Returns:
+        str: Generated Java source code.
+    """
+    source_code = []
+    # Reflection classes are fully qualified, so they cannot clash with the copied imports
+    source_code.extend(imports or [])
+    source_code.append(f'class {harness_name} {{')
+    source_code.append('\tstatic void run(String name, int index, java.lang.reflect.Method method, Object[] args) {')
+    source_code.append('\t\ttry {')
+    source_code.append('\t\t\tmethod.invoke(null, args);')
+    source_code.append('\t\t} catch (java.lang.reflect.InvocationTargetException e) {')
+    source_code.append('\t\t\tSystem.out.println("CRASH\\t" + name + "\\t" + index + "\\t" + e.getCause().getClass().getName());')
+    source_code.append('\t\t} catch (Throwable t) {')
+    source_code.append('\t\t}')
+    source_code.append('\t}')
+
+    # One method per target method, to stay below the JVM method size limit
+    for method_index, (signature, cases, first_index) in enumerate(methods):
+        types = [get_erased_type(java_type) for java_type, _ in signature['parameters']]
+        type_args = ''.join(f', {java_type}.class' for java_type in types)
+        source_code.append(f'\tstatic void screen{method_index}() throws Exception {{')
+        source_code.append(f'\t\tjava.lang.reflect.Method method = {class_name}.class.getDeclaredMethod("{signature["name"]}"{type_args});')
+        source_code.append('\t\tmethod.setAccessible(true);')
+        for case_index, case in enumerate(cases):
+            args = ', '.join(f'({get_erased_type(java_type)}) {to_java_expression(java_type, case[name])}'
+                             for java_type, name in signature['parameters'])
+            source_code.append(f'\t\trun("{signature["name"]}", {first_index + case_index}, method, new Object[]{{{args}}});')
+        source_code.append('\t\tSystem.out.flush();')
+        source_code.append('\t}')
+
+    source_code.append('\tpublic static void main(String[] args) throws Exception {')
+    for method_index in range(len(methods)):
+        source_code.append(f'\t\tscreen{method_index}();')
+    source_code.append('\t}')
+    source_code.append('}')
+
+    return '\n'.join(source_code)
+
+def run_prescreen(file_path: str, class_name: str, seed: int = 0, timeout: int = PRESCREEN_TIMEOUT) -> dict:
+    """
+    Runs the static methods of the class against boundary and random inputs in one JVM.
+
+    Args:
+        file_path (str): Path to the Java source file.
+        class_name (str): Name of the class under test.
+        seed (int, optional): Seed of the random inputs, so reruns produce the same cases.
+        timeout (int, optional): Timeout of the JVM run, in seconds. Methods that did not
+            finish in time are reported as not screened.
+
+    Returns:
+        dict: Counterexample inputs, in the format returned by `get_inputs`, by method name,
+            for every method for which a crash was found.
+    """
+    rng = random.Random(seed)
+    harness_name = f'PreScreen{class_name}'
+
+    methods = []
+    cases = []
+    for signature in get_all_method_signatures(file_path):
+        # Instance methods need a receiver, leave them to JBMC
+        if not signature['static']:
+            continue
+        method_cases = get_cases(signature['parameters'], rng)
+        methods.append((signature, method_cases, len(cases)))
+        cases.extend((signature, case) for case in method_cases)
+
+    if not methods:
+        return {}
+
+    with open(harness_name + '.java', 'w') as file:
+        file.write(generate_prescreen_source(class_name, harness_name, methods, get_import_lines(file_path)))
+
+    try:
+        compilation = subprocess.run(['javac', '-cp', '.', harness_name + '.java', file_path], capture_output=True, text=True)
+        if compilation.returncode != 0:
+            print(f'Pre-screen harness did not compile, skipping pre-screen:\n{compilation.stderr}')
+            return {}
+
+        try:
+            result = subprocess.run(['java', '-ea', '-cp', '.', harness_name], capture_output=True, text=True, timeout=timeout)
+            output = result.stdout
+        except subprocess.TimeoutExpired as error:
+            output = error.stdout.decode() if isinstance(error.stdout, bytes) else (error.stdout or '')
+    finally:
+        for leftover in (harness_name + '.java', harness_name + '.class'):
+            if os.path.isfile(leftover):
+                os.remove(leftover)
+
+    counterexample_inputs = {}
+    seen = set()
+    for line in output.splitlines():
+        fields = line.split('\t')
+        if fields[0] != 'CRASH' or len(fields) != 4:
+            continue
+        _, method_name, index, exception = fields
+
+        # One counterexample per method and exception type is enough
+        if (method_name, exception) in seen:
+            continue
+        seen.add((method_name, exception))
+
+        signature, case = cases[int(index)]
+        # Named like the JBMC trace inputs, source names such as `args` can clash in `main`
+        inputs = {f'arg{i}': {'type': java_type, 'value': case[name]}
+                  for i, (java_type, name) in enumerate(signature['parameters'])}
+        counterexample_inputs.setdefault(method_name, []).append({'inputs': inputs, 'reason': f'{exception} thrown'})
+
+    return counterexample_inputs
@@ -0,0 +1,316 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import itertools
+import os
+import queue
+import select
+import struct
+import subprocess
+import threading
+import time
+from helpers.java_helpers import get_method_sources, start_trace_xml
+
+DEBOUNCE_SECONDS = 0.3
+POLL_INTERVAL = 0.5
+# Sources written by the tool itself, which must not trigger a new run
+IGNORED_PATTERNS = ['CounterExample*.java', 'PreScreen*.java']
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def is_watched_source(file_name: str) -> bool:
+    """
+    Check if a file is a Java source edited by the user.
+
+    Args:
+        file_name (str): Name of the file.
+
+    Returns:
+        bool: True if changes to the file should trigger a new run, False otherwise.
+    """
+    if not file_name.endswith('.java'):
+        return False
+    return not any(fnmatch.fnmatch(file_name, pattern) for pattern in IGNORED_PATTERNS)
+
+def open_inotify(directory: str):
+    """
+    Open an inotify descriptor watching the directory for file changes.
+
+    Args:
+        directory (str): Directory to watch.
+
+    Returns:
+        int: The inotify file descriptor, or None if inotify is not available.
+    """
+    library = ctypes.util.find_library('c')
+    if library is None:
+        return None
+    try:
+        libc = ctypes.CDLL(library, use_errno=True)
+        fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def read_inotify_events(fd: int, timeout: float) -> set:
+    """
+    Wait for inotify events and return the names of the files they concern.
+
+    Args:
+        fd (int): The inotify file descriptor.
+        timeout (float): Maximum time to wait, in seconds.
+
+    Returns:
+        set: Names of the changed files, empty on timeout.
+    """
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if not ready:
+        return set()
+
+    data = os.read(fd, 64 * 1024)
+    names = set()
+    offset = 0
+    while offset < len(data):
+        _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        names.add(data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace'))
+        offset += length
+    return names
+
+def get_modification_times(directory: str) -> dict:
+    """
+    Return the modification time of every watched source in the directory.
+
+    Args:
+        directory (str): Directory to scan.
+
+    Returns:
+        dict: Modification times by file name.
+    """
+    times = {}
+    for entry in os.scandir(directory):
+        if entry.is_file() and is_watched_source(entry.name):
+            times[entry.name] = entry.stat().st_mtime_ns
+    return times
+
+def watch_java_files(directory: str, debounce: float = DEBOUNCE_SECONDS, poll_interval: float = POLL_INTERVAL):
+    """
+    Yield the Java sources changed in the directory, one burst of saves at a time.
+
+    Uses inotify where available and falls back to polling modification times. A burst
+    ends once no change was seen for `debounce` seconds.
+
+    Args:
+        directory (str): Directory to watch.
+        debounce (float, optional): Quiet time ending a burst, in seconds.
+        poll_interval (float, optional): Scan interval of the polling fallback, in seconds.
+
+    Yields:
+        set: Paths of the changed Java sources.
+    """
+    fd = open_inotify(directory)
+    if fd is None:
+        print('inotify is not available, polling for changes.')
+
+    def wait_for_changes(timeout):
+        if fd is not None:
+            return {name for name in read_inotify_events(fd, timeout) if is_watched_source(name)}
+
+        nonlocal times
+        time.sleep(timeout)
+        current = get_modification_times(directory)
+        changed = {name for name in current.keys() | times.keys() if current.get(name) != times.get(name)}
+        times = current
+        return changed
+
+    times = get_modification_times(directory)
+    try:
+        while True:
+            changed = wait_for_changes(None if fd is not None else poll_interval)
+            if not changed:
+                continue
+
+            # Collect the rest of the burst
+            while True:
+                more = wait_for_changes(debounce)
+                if not more:
+                    break
+                changed |= more
+            yield {os.path.join(directory, name) for name in changed}
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+class WatchSession:
+    """
+    Re-verification of the methods of a Java class as its sources change.
+
+    Methods are verified by a pool of worker threads pulling from a priority queue.
+    When a method is edited, its in-flight JBMC run is cancelled and the method is
+    queued again ahead of the methods that were not edited.
+    """
+
+    def __init__(self, jbmc_path: str, file_path: str, class_name: str, options_for, on_trace, workers: int = 1):
+        """
+        Args:
+            jbmc_path (str): Path to the JBMC executable.
+            file_path (str): Path to the Java source file.
+            class_name (str): Name of the Java class.
+            options_for (callable): Returns the JBMC options of a method.
+            on_trace (callable): Called with the method name and XML trace of every
+                completed run. Calls are serialized.
+            workers (int, optional): Number of JBMC processes to run in parallel.
+        """
+        self.jbmc_path = jbmc_path
+        self.file_path = file_path
+        self.class_name = class_name
+        self.options_for = options_for
+        self.on_trace = on_trace
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._generations = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._result_lock = threading.Lock()
+        self._source = ''
+        self._method_sources = {}
+        # Stale methods and changed sources carried over until a compilation succeeds
+        self._pending_methods = set()
+        self._pending_files = set()
+
+        for _ in range(max(1, workers)):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def start(self, methods: list) -> None:
+        """
+        Queue the initial verification of the methods, in the given order.
+
+        Args:
+            methods (list): Method names.
+        """
+        with open(self.file_path, 'r') as file:
+            self._source = file.read()
+        self._method_sources = get_method_sources(self.file_path)
+        self._submit(methods, priority=1)
+
+    def update(self, changed_files: set) -> None:
+        """
+        Recompile the changed sources and re-verify the methods they affect.
+
+        Methods of the class under verification whose source changed are cancelled and
+        queued first. A change outside the methods, or to another source of the
+        directory, makes every method stale. When the compilation fails, the stale
+        methods and changed sources are kept and retried with the next change.
+
+        Args:
+            changed_files (set): Paths of the changed Java sources.
+        """
+        # Editors saving through a rename can leave the file missing for a moment
+        if not os.path.isfile(self.file_path):
+            return
+
+        target = os.path.abspath(self.file_path)
+        with open(self.file_path, 'r') as file:
+            source = file.read()
+        method_sources = get_method_sources(self.file_path)
+
+        stale = [name for name, method_source in method_sources.items() if self._method_sources.get(name) != method_source]
+        removed = [name for name in self._method_sources if name not in method_sources]
+        other_changed = any(os.path.abspath(path) != target for path in changed_files)
+        if other_changed or (source != self._source and not stale and not removed):
+            stale = list(method_sources)
+        self._source = source
+        self._method_sources = method_sources
+
+        self._cancel(stale + removed)
+        self._pending_methods = (self._pending_methods | set(stale)) - set(removed)
+        self._pending_files |= set(changed_files)
+        if not self._pending_methods:
+            return
+
+        # Only the changed sources need compiling, the class files of the others are current
+        existing = [path for path in self._pending_files if os.path.isfile(path)] or [self.file_path]
+        start_time = time.time()
+        compilation = subprocess.run(['javac', '-cp', '.'] + existing, capture_output=True, text=True)
+        if compilation.returncode != 0:
+            print(f'Compilation failed, waiting for the next change:\n{compilation.stderr}')
+            return
+
+        # Keep the source order of the methods within the queue
+        stale = [name for name in method_sources if name in self._pending_methods]
+        self._pending_methods = set()
+        self._pending_files = set()
+        print(f'Recompiled {len(existing)} file(s) in {time.time() - start_time:.2f}s, re-verifying: {", ".join(stale)}')
+        self._submit(stale, priority=0)
+
+    def _submit(self, methods: list, priority: int) -> None:
+        with self._lock:
+            for method in methods:
+                generation = self._generations.get(method, 0) + 1
+                self._generations[method] = generation
+                self._queue.put((priority, next(self._sequence), method, generation))
+
+    def _cancel(self, methods: list) -> None:
+        with self._lock:
+            for method in methods:
+                # Bumping the generation discards queued runs of the old version
+                self._generations[method] = self._generations.get(method, 0) + 1
+                process = self._running.pop(method, None)
+                if process is not None:
+                    process.terminate()
+
+    def _work(self) -> None:
+        while True:
+            _, _, method, generation = self._queue.get()
+            # A failing run is reported and skipped, the worker keeps serving the queue
+            try:
+                self._verify(method, generation)
+            except Exception as error:
+                print(f'Could not verify {method}: {error}')
+
+    def _verify(self, method: str, generation: int) -> None:
+        with self._lock:
+            if self._generations.get(method) != generation:
+                return
+
+        # Computing the options can take a while, keep `update` from waiting on it
+        options = self.options_for(method)
+        with self._lock:
+            if self._generations.get(method) != generation:
+                return
+            process = start_trace_xml(self.jbmc_path, self.class_name, method, options)
+            self._running[method] = process
+
+        start_time = time.time()
+        try:
+            trace_xml_source, _ = process.communicate()
+        finally:
+            with self._lock:
+                if self._running.get(method) is process:
+                    del self._running[method]
+        with self._lock:
+            current = self._generations.get(method) == generation and process.returncode >= 0
+        if not current:
+            return
+
+        with self._result_lock:
+            print(f'Verified {method} in {time.time() - start_time:.2f}s')
+            try:
+                self.on_trace(method, trace_xml_source)
+            except Exception as error:
+                print(f'Could not generate counterexamples for {method}: {error}')
@@ -1,24 +1,39 @@
 import sys
 import os
 import time
+import argparse
 from helpers.java_helpers import generate_java_source, compile_java_class, get_trace_xml, get_all_method_names
 from helpers.input_parser import get_inputs
+from helpers.counterexample_writer import CounterExampleWriter, content_hash_name, OUTPUT_MODES
+from helpers.prescreen import run_prescreen
+from helpers.watch_mode import WatchSession, watch_java_files
+from helpers.class_reachability import ClassPath, get_reachable_classes, prune_classpath, display_pruning_report
+from helpers.job_scheduler import (load_history, save_history, record_run, get_bytecode_stats,
+                                   estimate_runtimes, run_scheduled, display_schedule_report)
 
 # Global variable for max retries
 MAX_RETRIES = 3
 COUNTER = 0
+CLASSPATH = ['../../lib/core-models.jar', '../../lib/cprover-api.jar', '.']
 
 # Function to compile Java source code and run JBMC
-def compile_and_run_jbmc(jbmc_path, file_path, filename, unwind_limit):
+def compile_and_run_jbmc(jbmc_path, file_path, filename, unwind_limit, workers=1, unwind_overrides=None, prune=False):
     """
     Compiles the Java source code and runs JBMC to obtain trace XML source.
 
+    Methods are dispatched longest-first across the workers, based on the runtimes
+    recorded in previous runs or, for new methods, on their bytecode size.
+
     Args:
         jbmc_path (str): Path to the JBMC executable.
         file_path (str): Path to the Java source file.
         filename (str): Name of the Java source file.
         unwind_limit (int): Unwind limit for JBMC.
-        extra_jbmc_options (str): Extra JBMC Options.
+        workers (int, optional): Number of JBMC processes to run in parallel.
+        unwind_overrides (dict, optional): Unwind limit to use instead of `unwind_limit`,
+            by method name. Methods with an override of 0 are not run.
+        prune (bool, optional): Give JBMC a classpath narrowed to the classes reachable
+            from each method.
 
     Returns:
         list: List of tuples containing method names and trace XML sources.
@@ -44,24 +59,52 @@ def compile_and_run_jbmc(jbmc_path, file_path, filename, unwind_limit):
             break
     sys.stdout.write('\r' + ' ' * 50 + '\r')  # Clear the loading animation
 
+    unwind_overrides = unwind_overrides or {}
     methods = get_all_method_names(file_path)
-    trace_xml_source_list = []
-
-    for method in methods:
-        trace_xml_source = get_trace_xml(
+    jobs = {f'{filename}.{method}': method for method in methods if unwind_overrides.get(method) != 0}
+
+    history = load_history(unwind_limit)
+    estimates = estimate_runtimes(list(jobs), history, get_bytecode_stats(filename), unwind_limit)
+
+    # Narrow the classpath of each method to the classes it can reach
+    classpaths = {method: CLASSPATH for method in jobs.values()}
+    pruned = {}
+    if prune:
+        classpath = ClassPath(CLASSPATH)
+        total = sum(len(classpath.get_jar_classes(entry)) for entry in CLASSPATH if entry.endswith('.jar'))
+        for key, method in jobs.items():
+            reachable = get_reachable_classes(classpath, filename, method)
+            classpaths[method] = prune_classpath(classpath, reachable)
+            loaded = sum(1 for name in reachable if classpath.find(name).endswith('.jar'))
+            pruned[key] = {'classes': loaded, 'total': total}
+
+    def run_jbmc(method):
+        return get_trace_xml(
             jbmc_path,
             filename,
             method,
-            ['--unwind', str(unwind_limit), "-cp", "../../lib/core-models.jar:../../lib/cprover-api.jar:."]
+            ['--unwind', str(unwind_overrides.get(method, unwind_limit)), "-cp", ":".join(classpaths[method])]
         )
 
+    schedule = run_scheduled(jobs, run_jbmc, workers, estimates, history)
+    if prune:
+        display_pruning_report(pruned, schedule['runtimes'], history)
+
+    trace_xml_source_list = []
+    for key, method in jobs.items():
+        trace_xml_source = schedule['results'][key]
+        # Runs at a lower unwind limit would skew the estimates of full runs
+        if method not in unwind_overrides:
+            record_run(history, key, schedule['runtimes'][key], len(trace_xml_source), full_classpath=not prune)
         trace_xml_source_list.append((method, trace_xml_source))
 
+    save_history(history, unwind_limit)
+    display_schedule_report(schedule, estimates, history)
 
     return trace_xml_source_list
 
 # Function to generate Java counterexample source files
-def generate_counterexamples(filename, method_name, counterexample_inputs):
+def generate_counterexamples(filename, method_name, counterexample_inputs, writer, hash_names=False):
     """
     Generates Java counterexample source files based on the trace XML sources.
 
@@ -69,12 +112,15 @@ def generate_counterexamples(filename, method_name, counterexample_inputs):
         filename (str): Name of the Java source file.
         method_name (str): Name of the method associated with the counterexample.
         counterexample_inputs (dict): Counterexample inputs and reason.
+        writer (CounterExampleWriter): Writer the generated sources are queued on.
+        hash_names (bool, optional): Name classes after the hash of their source
+            instead of the running counter.
     """
     global COUNTER
     for i, counterexample_input in enumerate(counterexample_inputs):
         reason = counterexample_input['reason']
         inputs = counterexample_input['inputs']
-        out_class_name = f'CounterExample{COUNTER}'
+        out_class_name = 'CounterExample' if hash_names else f'CounterExample{COUNTER}'
         COUNTER = COUNTER + 1
 
         # Generate Java counterexample source code
@@ -86,9 +132,14 @@ def generate_counterexamples(filename, method_name, counterexample_inputs):
             method_name = method_name
         )
 
-        # Write the generated source code to a file
-        with open(out_class_name + '.java', 'w') as file:
-            file.write(source)
+        if hash_names:
+            # Same source, same name: unchanged counterexamples keep their file between runs
+            hashed_class_name = content_hash_name(source)
+            source = source.replace(f'class {out_class_name} {{', f'class {hashed_class_name} {{', 1)
+            out_class_name = hashed_class_name
+
+        # Queue the generated source code for writing
+        writer.write(out_class_name, source, method=method_name, reason=reason)
 
 # Function to display JBMC result
 def display_jbmc_result(counterexample_count):
@@ -114,11 +165,12 @@ def main(argv):
         argv (list): List of command-line arguments.
     """
     # Get JBMC path, Java file path, and filename from command-line arguments
+    args = parse_args(argv)
     retry_count = 0
 
     while retry_count < MAX_RETRIES:
-        jbmc_path = argv[1] or './jbmc'
-        file_path = argv[2]
+        jbmc_path = args.jbmc_path or './jbmc'
+        file_path = args.file_path
         filename = file_path.split('.')[0]
 
         # Check if the JBMC path is correct
@@ -146,20 +198,134 @@ def main(argv):
     # Ask the user for the unwind limit or use the default value
     unwind_limit = get_unwind_limit_from_user()
 
+    if args.watch:
+        run_watch_mode(args, jbmc_path, file_path, filename, unwind_limit)
+        return
+
+    # Run the target methods on cheap concrete inputs first, JBMC only confirms what crashed
+    prescreen_inputs = {}
+    if args.prescreen:
+        print('Running pre-screen...')
+        prescreen_inputs = run_prescreen(file_path, filename)
+        print(f'Pre-screen found crashes in {len(prescreen_inputs)} methods.')
+    unwind_overrides = {method: args.prescreen_unwind for method in prescreen_inputs}
+
     # Compile Java source code and run JBMC, get trace XML source
-    trace_xml_source_list = compile_and_run_jbmc(jbmc_path, file_path, filename, unwind_limit)
+    trace_xml_source_list = compile_and_run_jbmc(jbmc_path, file_path, filename, unwind_limit, args.jobs, unwind_overrides,
+                                                 args.prune_classpath)
 
     # Parse counterexamples from trace XML source
     print('Parsing counterexamples...')
     counterexample_inputs = []
-    for method, trace_xml_source in trace_xml_source_list:
-        counterexample_input = get_inputs(trace_xml_source)
-        counterexample_inputs.append((method, counterexample_input))
-        generate_counterexamples(filename, method, counterexample_input)
+    with CounterExampleWriter(args.output, args.output_path) as writer:
+        for method, counterexample_input in prescreen_inputs.items():
+            counterexample_inputs.append((method, counterexample_input))
+            generate_counterexamples(filename, method, counterexample_input, writer, args.hash_names)
+        for method, trace_xml_source in trace_xml_source_list:
+            counterexample_input = get_inputs(trace_xml_source)
+            counterexample_inputs.append((method, counterexample_input))
+            generate_counterexamples(filename, method, counterexample_input, writer, args.hash_names)
+
+    if writer.skipped:
+        print(f'{writer.written} counterexamples written, {writer.skipped} unchanged.')
 
     # Display JBMC result
     display_jbmc_result(COUNTER)
 
+# Function to re-verify the Java source on every change
+def run_watch_mode(args, jbmc_path, file_path, filename, unwind_limit):
+    """
+    Verifies all methods, then re-verifies the edited methods first on every save.
+
+    Counterexamples are written as soon as each JBMC run completes, named after the
+    hash of their source. Those of earlier versions of a method are removed once the
+    method is verified again.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments.
+        jbmc_path (str): Path to the JBMC executable.
+        file_path (str): Path to the Java source file.
+        filename (str): Name of the Java source file.
+        unwind_limit (int): Unwind limit for JBMC.
+    """
+    # Model jars are parsed once, changed class files are parsed again on lookup
+    full_classpath = ClassPath(CLASSPATH)
+
+    def options_for(method):
+        classpath = CLASSPATH
+        if args.prune_classpath:
+            classpath = prune_classpath(full_classpath, get_reachable_classes(full_classpath, filename, method))
+        return ['--unwind', str(unwind_limit), "-cp", ":".join(classpath)]
+
+    # Counterexample classes of the latest run, by method
+    written_classes = {}
+
+    def on_trace(method, trace_xml_source):
+        counterexample_input = get_inputs(trace_xml_source)
+        with CounterExampleWriter('files', args.output_path) as writer:
+            generate_counterexamples(filename, method, counterexample_input, writer, hash_names=True)
+
+        # Remove the counterexamples of earlier versions of the method
+        class_names = set(writer.get_class_names())
+        for class_name in written_classes.get(method, set()) - class_names:
+            stale_path = os.path.join(writer.output_path, class_name + '.java')
+            if os.path.isfile(stale_path):
+                os.remove(stale_path)
+        written_classes[method] = class_names
+        if counterexample_input:
+            print(f'{method}: {len(counterexample_input)} counterexamples.')
+        else:
+            print(f'{method}: no counterexamples.')
+
+    print('Compiling Java source...')
+    compile_java_class(file_path)
+
+    session = WatchSession(jbmc_path, file_path, filename, options_for, on_trace, args.jobs)
+    session.start(get_all_method_names(file_path))
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    print(f'Watching {directory} for changes, press Ctrl+C to stop.')
+    try:
+        for changed_files in watch_java_files(directory):
+            session.update(changed_files)
+    except KeyboardInterrupt:
+        print('DONE')
+
+# Function to parse command-line arguments
+def parse_args(argv):
+    """
+    Parses the command-line arguments.
+
+    Args:
+        argv (list): List of command-line arguments.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]))
+    parser.add_argument('jbmc_path', help='Path to the JBMC executable.')
+    parser.add_argument('file_path', help='Java source file to verify.')
+    parser.add_argument('--output', choices=OUTPUT_MODES, default='files',
+                        help='Write one file per counterexample, a single zip archive, or a single source bundle.')
+    parser.add_argument('--output-path', default=None,
+                        help='Output directory (files) or output file (zip, bundle).')
+    parser.add_argument('--hash-names', action='store_true',
+                        help='Name counterexamples after the hash of their source so unchanged ones are not rewritten.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of JBMC processes to run in parallel, longest method first.')
+    parser.add_argument('--prescreen', action='store_true',
+                        help='Run static methods on boundary and random inputs before JBMC.')
+    parser.add_argument('--prescreen-unwind', type=int, default=0,
+                        help='Unwind limit for JBMC on methods the pre-screen found crashes in (default 0: skip JBMC).')
+    parser.add_argument('--prune-classpath', action='store_true',
+                        help='Give JBMC only the model classes reachable from each method.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and re-verify the edited methods on every save.')
+    args = parser.parse_args(argv[1:])
+    if args.watch and args.output != 'files':
+        parser.error('--watch writes one file per counterexample, --output cannot be used with it')
+    return args
+
 # Function to get user input for the unwind limit
 def get_unwind_limit_from_user():
     """